@@ -7,7 +7,8 @@ and provide a Streamlit interface to explore outliers.
 Steps:
   1. Resolve the path to the processed datamart
   2. Load the fact_transactions table and compute tx_per_account
-  3. Fit an IsolationForest and compute an anomaly score for each transaction
+  3. Fit an IsolationForest once and compute an anomaly score for each transaction;
+     the contamination level only moves the threshold on those cached scores
   4. Expose a Streamlit app to:
        - adjust the contamination level
        - view score distribution correctly
@@ -20,6 +21,7 @@ import streamlit as st
 from pathlib import Path
 from sqlalchemy import create_engine
 from sklearn.ensemble import IsolationForest
+from etl import read_table
 
 # ─── 1) Resolve DB path and connect ───────────────────────────────────────────────
 ROOT    = Path(__file__).resolve().parent.parent
@@ -29,31 +31,67 @@ engine  = create_engine(f"sqlite:///{DB_PATH}")
 @st.cache_data
 def load_data():
     """Load transactions and compute frequency feature."""
-    df_tx = pd.read_sql_table("fact_transactions", engine)
-    # compute transactions per account
-    freq = (
+    df_tx = read_table("fact_transactions", engine, parse_dates=["transaction_date"])
+    return add_tx_per_account(df_tx)
+
+def add_tx_per_account(df_tx: pd.DataFrame) -> pd.DataFrame:
+    """Add the per-account transaction count (frequency feature) to df_tx in place."""
+    # compute transactions per account, broadcast back to each row
+    df_tx["tx_per_account"] = (
         df_tx
         .groupby("account_id")["transaction_id"]
-        .count()
-        .rename("tx_per_account")
+        .transform("size")
     )
-    df = df_tx.merge(freq, on="account_id")
-    return df
+    return df_tx
+
+def anomaly_features(df: pd.DataFrame) -> np.ndarray:
+    """
+    Return the ['amount', 'tx_per_account'] matrix as float32, the dtype the
+    forest's trees work in, so fitting and scoring need no conversion copy.
+    """
+    return df[["amount", "tx_per_account"]].to_numpy(dtype=np.float32)
 
-def detect_anomalies(df: pd.DataFrame, contamination: float):
+def score_transactions(X: np.ndarray, n_jobs: int = -1) -> np.ndarray:
     """
-    Fit IsolationForest on ['amount', 'tx_per_account'] and
-    return the DataFrame with anomaly_score and is_anomaly flag.
+    Fit IsolationForest on X and return the anomaly score of each row.
+    n_jobs defaults to all cores; server processes should pass 1 so that
+    several workers do not oversubscribe the machine.
     """
-    X = df[["amount", "tx_per_account"]].to_numpy()
-    iso = IsolationForest(contamination=contamination, random_state=42)
+    # max_samples="auto" already subsamples min(256, n) rows per tree as in
+    # the original paper
+    iso = IsolationForest(n_estimators=100, max_samples="auto", n_jobs=n_jobs, random_state=42)
     iso.fit(X)
-    # decision_function gives larger = more normal, so invert it
-    scores = -iso.decision_function(X)
-    df["anomaly_score"] = scores
-    threshold = np.quantile(scores, 1 - contamination)
-    df["is_anomaly"] = df["anomaly_score"] >= threshold
-    return df
+    # decision_function gives larger = more normal, so invert it (in place)
+    scores = iso.decision_function(X)
+    return np.negative(scores, out=scores)
+
+@st.cache_data(max_entries=1)
+def cached_scores(X: np.ndarray) -> np.ndarray:
+    """
+    score_transactions cached on the content of X, so the dashboard fits the
+    forest once per dataset rather than on every slider change.
+    """
+    return score_transactions(X)
+
+def apply_threshold(scores: np.ndarray, contamination: float) -> np.ndarray:
+    """Flag the top `contamination` fraction of scores as anomalies."""
+    if not 0 < contamination <= 0.5:
+        raise ValueError(f"contamination must be in (0, 0.5], got {contamination}")
+    if len(scores) == 0:
+        raise ValueError("cannot threshold an empty array of scores")
+    # The (1 - contamination) quantile rounded up to an order statistic,
+    # found with one partial selection instead of np.quantile's interpolation
+    k = int(np.ceil(round((len(scores) - 1) * (1 - contamination), 9)))
+    threshold = np.partition(scores, k)[k]
+    return scores >= threshold
+
+def detect_anomalies(df: pd.DataFrame, contamination: float) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Score ['amount', 'tx_per_account'] with IsolationForest and return
+    (anomaly_score, is_anomaly) arrays aligned with df; df is left untouched.
+    """
+    scores = score_transactions(anomaly_features(df))
+    return scores, apply_threshold(scores, contamination)
 
 def main():
     st.title("🚨 Transaction Anomaly Detection")
@@ -69,21 +107,24 @@ def main():
         min_value=0.01, max_value=0.20, value=0.05, step=0.01
     )
 
-    df_result = detect_anomalies(df.copy(), contamination)
+    scores = cached_scores(anomaly_features(df))
+    is_anomaly = apply_threshold(scores, contamination)
 
     st.subheader("Anomaly Score Distribution")
     # compute histogram bins and counts
-    counts, bin_edges = np.histogram(df_result["anomaly_score"], bins=50)
+    counts, bin_edges = np.histogram(scores, bins=50)
     hist_df = pd.DataFrame(
         {"count": counts}, 
         index=pd.IntervalIndex.from_breaks(bin_edges)
     )
     st.bar_chart(hist_df)
 
-    st.subheader(f"Top {min(20, int(len(df_result)*contamination))} Anomalous Transactions")
+    st.subheader(f"Top {min(20, int(len(df)*contamination))} Anomalous Transactions")
+    # only the flagged rows get the new columns, the full frame is never copied
     st.dataframe(
-        df_result
-        .loc[df_result["is_anomaly"]]
+        df
+        .loc[is_anomaly]
+        .assign(anomaly_score=scores[is_anomaly], is_anomaly=True)
         .sort_values("anomaly_score", ascending=False)
         .head(20)
         .reset_index(drop=True)
@@ -4,33 +4,144 @@ app.py
 FastAPI application exposing endpoints for:
   - /score_default: compute default risk per account
   - /predict_churn: compute churn risk per client
-  - /detect_anomaly: return anomaly scores for transactions
+  - /score_default_bulk, /predict_churn_bulk: same scores for a batch of ids,
+    with one query and one batched predict per call
+  - /detect_anomaly: return the top anomalous transactions, one array per column
+
+Default and churn scoring are point lookups in the feat_accounts / feat_clients
+tables built by the ETL. Transactions for anomaly detection are read once into
+memory and reloaded in the background whenever the SQLite file changes. Both
+models run one dummy prediction at import so no user request pays their warm-up.
 
 Usage:
-    uvicorn src.app:app --reload --host 0.0.0.0 --port 8000
+    uvicorn app:app --app-dir src --reload --host 0.0.0.0 --port 8000
 """
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+import logging
+import threading
+import time
+from fastapi import FastAPI, HTTPException, Response
+from pydantic import BaseModel, Field
 from pathlib import Path
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text, bindparam
 import pandas as pd
+import numpy as np
 import joblib
+import orjson
 import xgboost as xgb
-from anomaly import detect_anomalies, load_data as load_tx_data
+from etl import DB_PATH, read_table
+from anomaly import add_tx_per_account, anomaly_features, score_transactions, apply_threshold
 
 app = FastAPI(title="Risk & Customer Insights API")
+logger = logging.getLogger(__name__)
 
 # Resolve paths
 ROOT     = Path(__file__).resolve().parent
-DB_PATH  = ROOT.parent / "data" / "processed" / "risk_insights.db"
 ENGINE   = create_engine(f"sqlite:///{DB_PATH}")
 MODEL_DEF= ROOT.parent / "models" / "logreg_default.pkl"
-MODEL_CHURN = ROOT.parent / "models" / "xgb_churn.json"
+MODEL_DEF_ONNX   = MODEL_DEF.with_suffix(".onnx")
+IMPUTER_DEF      = MODEL_DEF.with_name("imputer_default.pkl")
+MODEL_CHURN = ROOT.parent / "models" / "xgb_churn.ubj"
+MODEL_CHURN_LIB  = MODEL_CHURN.with_suffix(".so")
+DEFAULT_FEATURES = ["avg_amount", "std_amount", "tx_count_per_day", "avg_delay_days"]
+CHURN_FEATURES   = ["tenure_days", "avg_balance", "total_tx_count", "days_since_last"]
 
 # Load models at startup
 logreg_model = joblib.load(MODEL_DEF)
+# training-time feature means, to fill the features an account has no value for
+default_means = joblib.load(IMPUTER_DEF).statistics_.astype(np.float32)
 xgb_model    = xgb.Booster()
 xgb_model.load_model(str(MODEL_CHURN))
+# Single-row requests are too small to benefit from intra-op threads: scale with
+# uvicorn worker processes instead (see Dockerfile) and keep one thread per model
+xgb_model.set_param({"nthread": 1})
+
+# Prefer the ONNX export of the default model (built by model_default.py) when available
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+def onnx_session(path: Path):
+    """Single-threaded onnxruntime session for the given model file."""
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = 1
+    options.inter_op_num_threads = 1
+    return ort.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+
+default_session = (
+    onnx_session(MODEL_DEF_ONNX)
+    if ort is not None and MODEL_DEF_ONNX.exists() else None
+)
+
+def predict_default_proba(X: np.ndarray) -> np.ndarray:
+    """Return default probabilities for a float32 matrix ordered as DEFAULT_FEATURES."""
+    # e.g. std_amount / avg_delay_days of a single-transaction account
+    rows, cols = np.nonzero(np.isnan(X))
+    if len(rows):
+        X = X.copy()
+        X[rows, cols] = default_means[cols]
+    if default_session is not None:
+        return default_session.run(["probabilities"], {"X": X})[0][:, 1]
+    return logreg_model.predict_proba(pd.DataFrame(X, columns=DEFAULT_FEATURES))[:, 1]
+
+# Prefer the Treelite-compiled churn model (built by model_churn.py) when available
+try:
+    import tl2cgen
+except ImportError:
+    tl2cgen = None
+churn_predictor = (
+    tl2cgen.Predictor(str(MODEL_CHURN_LIB), nthread=1)
+    if tl2cgen is not None and MODEL_CHURN_LIB.exists() else None
+)
+
+def predict_churn_proba(X: np.ndarray) -> np.ndarray:
+    """Return churn probabilities for a float32 matrix ordered as CHURN_FEATURES."""
+    if churn_predictor is not None:
+        return churn_predictor.predict(tl2cgen.DMatrix(X)).reshape(-1)
+    # inplace_predict reads the float32 buffer directly: no DMatrix allocation
+    return xgb_model.inplace_predict(X)
+
+def warmup_models():
+    """Run one dummy prediction per model so the first request skips lazy initialization."""
+    predict_default_proba(np.zeros((1, len(DEFAULT_FEATURES)), dtype=np.float32))
+    predict_churn_proba(np.zeros((1, len(CHURN_FEATURES)), dtype=np.float32))
+
+warmup_models()
+
+# ─── In-memory datamart cache ──────────────────────────────────────────────────
+RELOAD_INTERVAL = 30  # seconds between two checks of the database file
+
+def load_tables():
+    """
+    Read the datamart once and keep in memory:
+      - anomaly_base: transactions with the tx_per_account feature
+      - anomaly_scores: IsolationForest score of each of those transactions
+    """
+    mtime = DB_PATH.stat().st_mtime
+    df_tx = read_table("fact_transactions", ENGINE, parse_dates=["transaction_date"])
+    df_anom = add_tx_per_account(df_tx)
+    return {
+        "mtime": mtime,
+        "anomaly_base": df_anom,
+        # one core per uvicorn worker, the workers already share the machine
+        "anomaly_scores": score_transactions(anomaly_features(df_anom), n_jobs=1),
+    }
+
+def watch_tables(interval=RELOAD_INTERVAL):
+    """Reload the cached tables whenever the database file is modified."""
+    global TABLES
+    while True:
+        time.sleep(interval)
+        try:
+            if DB_PATH.stat().st_mtime != TABLES["mtime"]:
+                # swap the whole dict at once so requests never see a partial reload
+                TABLES = load_tables()
+        except Exception:
+            # e.g. the file is briefly missing or half-written during an ETL run:
+            # keep serving the current tables and try again at the next check
+            logger.exception("Reloading the datamart failed, keeping the cached tables")
+
+TABLES = load_tables()
+threading.Thread(target=watch_tables, daemon=True).start()
 
 # Request schemas
 default_input_fields = ["account_id"]
@@ -40,60 +151,109 @@ class DefaultRequest(BaseModel):
 class ChurnRequest(BaseModel):
     client_id: int
 
+# every id is one bound parameter of the IN lookup, kept under SQLite's
+# default SQLITE_MAX_VARIABLE_NUMBER (32766)
+MAX_BULK_IDS = 32_000
+
+class BulkDefaultRequest(BaseModel):
+    account_ids: list[int] = Field(max_length=MAX_BULK_IDS)
+
+class BulkChurnRequest(BaseModel):
+    client_ids: list[int] = Field(max_length=MAX_BULK_IDS)
+
 class AnomalyRequest(BaseModel):
-    contamination: float = 0.05
+    # same (0, 0.5] range IsolationForest accepts for contamination
+    contamination: float = Field(0.05, gt=0, le=0.5)
+
+def orjson_response(payload) -> Response:
+    """Serialize with orjson: numpy values natively, NaN as null, int keys allowed."""
+    return Response(
+        orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS),
+        media_type="application/json"
+    )
 
 # Endpoints
 @app.post("/score_default")
 def score_default(req: DefaultRequest):
-    # Load features aggregation
-    df_tx = pd.read_sql_table("fact_transactions", ENGINE)
-    df_time = pd.read_sql_table("dim_time", ENGINE)
-    # Prepare features for the given account_id
-    df = df_tx[df_tx["account_id"] == req.account_id].sort_values("transaction_date")
-    if df.empty:
+    # Point lookup of the precomputed account features
+    with ENGINE.connect() as conn:
+        row = conn.execute(
+            text("SELECT avg_amount, std_amount, tx_count_per_day, avg_delay_days "
+                 "FROM feat_accounts WHERE account_id = :account_id"),
+            {"account_id": req.account_id}
+        ).fetchone()
+    if row is None:
         raise HTTPException(status_code=404, detail="Account not found or no transactions")
-    total_days = df_time["date"].nunique()
-    avg_amount = df["amount"].mean()
-    std_amount = df["amount"].std()
-    tx_count = df["transaction_id"].count()
-    avg_delay = df["transaction_date"].diff().dt.days.dropna().mean()
-    X = pd.DataFrame([{
-        "avg_amount": avg_amount,
-        "std_amount": std_amount,
-        "tx_count_per_day": tx_count / total_days,
-        "avg_delay_days": avg_delay
-    }])
-    score = logreg_model.predict_proba(X)[0,1]
+    X = np.asarray([row], dtype=np.float32)
+    score = predict_default_proba(X)[0]
     return {"account_id": req.account_id, "default_score": float(score)}
 
 @app.post("/predict_churn")
 def predict_churn(req: ChurnRequest):
-    # Load and merge
-    df_tx = pd.read_sql_table("fact_transactions", ENGINE)
-    df_acct = pd.read_sql_table("dim_accounts", ENGINE)
-    df = df_tx.merge(df_acct, on="account_id").query(f"client_id=={req.client_id}")
-    if df.empty:
+    # Point lookup of the precomputed client features
+    with ENGINE.connect() as conn:
+        row = conn.execute(
+            text("SELECT first_opened_date, avg_balance, total_tx_count, last_transaction_date "
+                 "FROM feat_clients WHERE client_id = :client_id"),
+            {"client_id": req.client_id}
+        ).fetchone()
+    if row is None:
         raise HTTPException(status_code=404, detail="Client not found or no transactions")
-    df["transaction_date"] = pd.to_datetime(df["transaction_date"])
-    df["opened_date"] = pd.to_datetime(df["opened_date"])
-    tenure = (pd.Timestamp.today() - df["opened_date"].min()).days
-    avg_bal = df["amount"].mean()
-    total_count = df["transaction_id"].count()
-    days_since = (pd.Timestamp.today() - df["transaction_date"].max()).days
-    dmat = xgb.DMatrix(pd.DataFrame([{
-        "tenure_days": tenure,
-        "avg_balance": avg_bal,
-        "total_tx_count": total_count,
-        "days_since_last": days_since
-    }]))
-    score = xgb_model.predict(dmat)[0]
+    first_opened, avg_bal, total_count, last_tx = row
+    today = pd.Timestamp.today()
+    tenure = (today - pd.Timestamp(first_opened)).days
+    days_since = (today - pd.Timestamp(last_tx)).days
+    X = np.asarray([[tenure, avg_bal, total_count, days_since]], dtype=np.float32)
+    score = predict_churn_proba(X)[0]
     return {"client_id": req.client_id, "churn_score": float(score)}
 
+@app.post("/score_default_bulk")
+def score_default_bulk(req: BulkDefaultRequest):
+    # One IN lookup and one batched predict; unknown account_ids are omitted
+    query = text(
+        "SELECT account_id, avg_amount, std_amount, tx_count_per_day, avg_delay_days "
+        "FROM feat_accounts WHERE account_id IN :ids"
+    ).bindparams(bindparam("ids", expanding=True))
+    df = pd.read_sql(query, ENGINE, params={"ids": req.account_ids})
+    if df.empty:
+        return {}
+    X = np.ascontiguousarray(df[DEFAULT_FEATURES].to_numpy(dtype=np.float32))
+    scores = predict_default_proba(X)
+    return orjson_response(dict(zip(df["account_id"].tolist(), scores)))
+
+@app.post("/predict_churn_bulk")
+def predict_churn_bulk(req: BulkChurnRequest):
+    # One IN lookup and one batched predict; unknown client_ids are omitted
+    query = text(
+        "SELECT client_id, first_opened_date, avg_balance, total_tx_count, last_transaction_date "
+        "FROM feat_clients WHERE client_id IN :ids"
+    ).bindparams(bindparam("ids", expanding=True))
+    df = pd.read_sql(query, ENGINE, params={"ids": req.client_ids},
+                     parse_dates=["first_opened_date", "last_transaction_date"])
+    if df.empty:
+        return {}
+    today = pd.Timestamp.today()
+    X = np.column_stack([
+        (today - df["first_opened_date"]).dt.days,
+        df["avg_balance"],
+        df["total_tx_count"],
+        (today - df["last_transaction_date"]).dt.days,
+    ]).astype(np.float32)
+    scores = predict_churn_proba(X)
+    return orjson_response(dict(zip(df["client_id"].tolist(), scores)))
+
 @app.post("/detect_anomaly")
 def detect_anomaly(req: AnomalyRequest):
-    df = load_tx_data()
-    df_res = detect_anomalies(df.copy(), contamination=req.contamination)
-    # return top 100 anomalies
-    out = df_res[df_res["is_anomaly"]]
-    return out.sort_values("anomaly_score", ascending=False).head(100).to_dict(orient="records")
+    tables = TABLES
+    # The forest is fit once per reload, only the threshold depends on the request
+    scores = tables["anomaly_scores"]
+    mask = apply_threshold(scores, req.contamination)
+    out = tables["anomaly_base"][mask].assign(anomaly_score=scores[mask], is_anomaly=True)
+    # return top 100 anomalies (partial sort), serialized column-wise:
+    # numpy columns are written natively, Arrow-backed ones as plain lists
+    top = out.nlargest(100, "anomaly_score")
+    payload = {
+        col: values.to_numpy() if isinstance(values.dtype, np.dtype) else values.tolist()
+        for col, values in top.items()
+    }
+    return orjson_response(payload)
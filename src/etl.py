@@ -6,13 +6,15 @@ This script implements the full ETL for the “DataHub Risk & Customer Insights
   2. Clean each dataset (accounts, transactions, KYC)
   3. Define a star schema (dimensions: clients, accounts, time; facts: transactions, events)
   4. Populate data/processed/risk_insights.db (SQLite) with all tables
+  5. Materialize per-account and per-client feature tables used for scoring
 
 It will automatically create the data/processed/ directory and the SQLite database file if they don’t exist.
 """
 
+import numpy as np
 import pandas as pd
 from pathlib import Path
-from sqlalchemy import create_engine, MetaData, Table, Column, Integer, String, Float, Date
+from sqlalchemy import create_engine, text, MetaData, Table, Column, Integer, String, Float, Date
 
 # ─── Setup project paths ─────────────────────────────────────────────────────────
 
@@ -25,6 +27,20 @@ PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
 DB_PATH        = PROCESSED_DIR / "risk_insights.db"
 DB_URL         = f"sqlite:///{DB_PATH}"
 
+# ─── Datamart Access ─────────────────────────────────────────────────────────────
+
+
+def read_table(table_name, engine, parse_dates=None):
+    """
+    Read a datamart table into Arrow-backed columns, so strings and numbers
+    are not materialized as Python objects. parse_dates lists the timestamp
+    columns to convert while reading.
+    """
+    return pd.read_sql(
+        f"SELECT * FROM {table_name}", engine,
+        parse_dates=parse_dates, dtype_backend="pyarrow"
+    )
+
 # ─── Extraction ──────────────────────────────────────────────────────────────────
 
 
@@ -141,48 +157,171 @@ def define_star_schema(metadata):
 
 def populate_time_dimension(df_transactions, engine):
     """
-    Build and load the time dimension from unique transaction dates.
+    Build and load the time dimension from unique transaction dates,
+    in chronological order.
     """
+    # transaction_date is already datetime64 after cleaning: normalize once, reuse .dt
+    dates = (
+        df_transactions["transaction_date"]
+        .dt.normalize()
+        .drop_duplicates()
+        .sort_values()
+        .reset_index(drop=True)
+    )
     df_time = pd.DataFrame({
-        "date": pd.to_datetime(df_transactions["transaction_date"]).dt.date.unique()
+        "date":    dates.dt.date,
+        "year":    dates.dt.year,
+        "month":   dates.dt.month,
+        "day":     dates.dt.day,
+        "quarter": dates.dt.quarter,
+        "weekday": dates.dt.weekday,
     })
-    df_time["year"]    = pd.to_datetime(df_time["date"]).dt.year
-    df_time["month"]   = pd.to_datetime(df_time["date"]).dt.month
-    df_time["day"]     = pd.to_datetime(df_time["date"]).dt.day
-    df_time["quarter"] = pd.to_datetime(df_time["date"]).dt.quarter
-    df_time["weekday"] = pd.to_datetime(df_time["date"]).dt.weekday
     df_time.to_sql("dim_time", engine, if_exists="replace", index=False)
     return df_time
 
+# ─── Feature Tables ─────────────────────────────────────────────────────────────
+
+
+NS_PER_DAY = 86_400_000_000_000
+
+def mean_delay_days(account_ids, dates):
+    """
+    Average whole days between consecutive transactions of each account,
+    computed with one diff over the sorted rows instead of one call per group.
+    Rows must be sorted by (account_id, date); the result follows the sorted
+    account_ids and is NaN for accounts with a single transaction.
+    """
+    codes, uniques = pd.factorize(account_ids, sort=True)
+    same   = codes[1:] == codes[:-1]           # consecutive rows of the same account
+    # plain int64 arithmetic on the nanosecond buffer, no timedelta64 temporaries
+    ns     = dates.astype("datetime64[ns]", copy=False).view("i8")
+    delays = np.diff(ns)[same] // NS_PER_DAY
+    groups = codes[1:][same]
+    sums   = np.bincount(groups, weights=delays, minlength=len(uniques))
+    counts = np.bincount(groups, minlength=len(uniques))
+    return np.divide(sums, counts, out=np.full(len(uniques), np.nan), where=counts > 0)
+
+def build_account_features(df_tx, total_days):
+    """
+    Aggregate default-scoring features per account_id:
+      - avg_amount: mean transaction amount
+      - std_amount: standard deviation of amounts
+      - tx_count: total number of transactions
+      - avg_delay_days: average days between transactions
+      - tx_count_per_day: transactions per day over the time dimension
+    """
+    # The aggregations are order-independent: run them on the frame as read
+    features = (
+        df_tx
+        .groupby("account_id")
+        .agg(
+            avg_amount     = ("amount",         "mean"),
+            std_amount     = ("amount",         "std"),
+            tx_count       = ("transaction_id", "count")
+        )
+        .reset_index()
+    )
+    # Only the delays need (account, date) order: sort those two columns,
+    # not every column of the transactions frame
+    keys = df_tx[["account_id", "transaction_date"]].sort_values(["account_id", "transaction_date"])
+    features["avg_delay_days"] = mean_delay_days(
+        keys["account_id"].to_numpy(), keys["transaction_date"].to_numpy()
+    )
+    features["tx_count_per_day"] = features["tx_count"] / total_days
+    return features
+
+def build_client_features(df_tx, df_accounts):
+    """
+    Aggregate churn features per client_id:
+      - first_opened_date: earliest opening date of the client's accounts
+      - avg_balance: mean transaction amount (proxy for balance)
+      - total_tx_count: total number of transactions
+      - last_transaction_date: date of the most recent transaction
+    Dates are stored rather than day counts so that tenure_days and
+    days_since_last stay correct when computed at scoring time.
+    """
+    df = df_tx.merge(df_accounts[["account_id", "opened_date"]], on="account_id")
+    return (
+        df
+        .groupby("client_id")
+        .agg(
+            first_opened_date     = ("opened_date",      "min"),
+            avg_balance           = ("amount",           "mean"),
+            total_tx_count        = ("transaction_id",   "count"),
+            last_transaction_date = ("transaction_date", "max")
+        )
+        .reset_index()
+    )
+
+def populate_feature_tables(df_tx, df_accounts, df_time, conn):
+    """
+    Materialize feat_accounts and feat_clients, indexed on their key,
+    so scoring is a point lookup instead of a scan of fact_transactions.
+    """
+    feat_accounts = build_account_features(df_tx, df_time["date"].nunique())
+    feat_clients  = build_client_features(df_tx, df_accounts)
+    feat_accounts.to_sql("feat_accounts", conn, if_exists="replace", index=False)
+    feat_clients.to_sql("feat_clients", conn, if_exists="replace", index=False)
+    conn.execute(text("CREATE UNIQUE INDEX ix_feat_accounts_account_id ON feat_accounts (account_id)"))
+    conn.execute(text("CREATE UNIQUE INDEX ix_feat_clients_client_id ON feat_clients (client_id)"))
+    return feat_accounts, feat_clients
+
 # ─── Load Data ─────────────────────────────────────────────────────────────────
 
+# Bulk-load settings: write-ahead log, no fsync per statement, temp data in memory
+LOAD_PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=OFF",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-262144",  # 256 MiB page cache
+]
+
 
 def load_data(df_accounts, df_transactions, df_kyc, engine, schema_tables):
     """
     Load cleaned DataFrames into the database following the star schema:
       - Dimensions: dim_clients, dim_accounts, dim_time
       - Facts: fact_transactions, fact_events
+      - Features: feat_accounts, feat_clients
     """
-    # 1) Dimensions
-    df_kyc.to_sql("dim_clients", engine, if_exists="replace", index=False)
-    df_accounts.to_sql("dim_accounts", engine, if_exists="replace", index=False)
-    df_time = populate_time_dimension(df_transactions, engine)
-
-    # 2) Fact: transactions
-    df_tx = df_transactions.copy()
-    # map dates → time_id (index +1 matches SQLite autoincrement)
-    df_tx["time_id"] = df_tx["transaction_date"].dt.date.map(
-        {row["date"]: idx+1 for idx, row in df_time.iterrows()}
-    )
-    # map accounts → client_id
-    df_tx["client_id"] = df_tx["account_id"].map(
-        dict(zip(df_accounts["account_id"], df_accounts["client_id"]))
-    )
-    df_tx.to_sql("fact_transactions", engine, if_exists="replace", index=False)
-
-    # 3) Fact: events (empty placeholder)
-    df_events = pd.DataFrame(columns=["client_id", "account_id", "time_id", "event_type"])
-    df_events.to_sql("fact_events", engine, if_exists="replace", index=False)
+    # All tables are written in a single transaction
+    with engine.begin() as conn:
+        for pragma in LOAD_PRAGMAS:
+            conn.exec_driver_sql(pragma)
+
+        # 1) Dimensions
+        df_kyc.to_sql("dim_clients", conn, if_exists="replace", index=False)
+        df_accounts.to_sql("dim_accounts", conn, if_exists="replace", index=False)
+        df_time = populate_time_dimension(df_transactions, conn)
+
+        # 2) Fact: transactions
+        # map dates → time_id (position +1 matches SQLite autoincrement)
+        time_ids = pd.DataFrame({
+            "day":     pd.to_datetime(df_time["date"]),
+            "time_id": np.arange(1, len(df_time) + 1),
+        })
+        df_tx = (
+            df_transactions
+            .assign(day=df_transactions["transaction_date"].dt.normalize())
+            .merge(time_ids, on="day", how="left")
+            .drop(columns="day")
+            # map accounts → client_id
+            .merge(df_accounts[["account_id", "client_id"]], on="account_id", how="left")
+        )
+        df_tx.to_sql("fact_transactions", conn, if_exists="replace", index=False)
+
+        # 3) Fact: events (empty placeholder)
+        df_events = pd.DataFrame(columns=["client_id", "account_id", "time_id", "event_type"])
+        df_events.to_sql("fact_events", conn, if_exists="replace", index=False)
+
+        # 4) Features: per-account and per-client aggregates
+        populate_feature_tables(df_tx, df_accounts, df_time, conn)
+
+    # WAL mode persists in the file: fold the log back into the database and
+    # return to a rollback journal, so readers watching its mtime see the load
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.exec_driver_sql("PRAGMA journal_mode=DELETE")
 
 
 # ─── Main ───────────────────────────────────────────────────────────────────────
@@ -20,12 +20,18 @@ fake = Faker()
 Faker.seed(42)
 n = 1000
 
+# Reference instants: dates are drawn as vectorized offsets from these,
+# Faker is only used for the string columns
+today = np.datetime64("today", "D")
+now   = pd.Timestamp.now().to_datetime64().astype("datetime64[us]")
+DAY   = 24 * 3600 * 10**6  # microseconds
+
 # Client accounts
 accounts = pd.DataFrame({
     "account_id": range(1, n+1),
     "client_id": np.random.randint(1, n//10, size=n),
     "account_type": np.random.choice(["checking","savings"], size=n),
-    "opened_date": [fake.date_between(start_date='-5y', end_date='today') for _ in range(n)]
+    "opened_date": today - np.random.randint(0, 5*365 + 1, size=n).astype("timedelta64[D]")
 })
 
 # Transactions
@@ -33,16 +39,17 @@ transactions = pd.DataFrame({
     "transaction_id": range(1, n+1),
     "account_id": np.random.choice(accounts.account_id, size=n),
     "amount": np.round(np.random.exponential(scale=200, size=n),2),
-    "transaction_date": [fake.date_time_between(start_date='-1y', end_date='now') for _ in range(n)],
+    "transaction_date": now - np.random.randint(0, 365*DAY, size=n, dtype=np.int64).astype("timedelta64[us]"),
     "transaction_type": np.random.choice(["debit","credit"], size=n)
 })
 
 # KYC
+clients = accounts.client_id.unique()
 kyc = pd.DataFrame({
-    "client_id": accounts.client_id.unique(),
-    "name": [fake.name() for _ in accounts.client_id.unique()],
-    "birthdate": [fake.date_of_birth(minimum_age=18, maximum_age=90) for _ in accounts.client_id.unique()],
-    "country": [fake.country() for _ in accounts.client_id.unique()]
+    "client_id": clients,
+    "name": [fake.name() for _ in clients],
+    "birthdate": today - np.random.randint(18*365, 90*365 + 1, size=len(clients)).astype("timedelta64[D]"),
+    "country": [fake.country() for _ in clients]
 })
 
 # Sauvegarde en CSV
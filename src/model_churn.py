@@ -6,8 +6,8 @@ handling missing values and dynamic database resolution.
 
 Steps:
   1. Resolve the path to the processed datamart
-  2. Load and merge account and transaction data
-  3. Aggregate features per client:
+  2. Load the feat_clients table materialized by the ETL
+  3. Derive features per client:
      - tenure_days: days since account opening
      - avg_balance: mean transaction amount (proxy for balance)
      - total_tx_count: total number of transactions
@@ -19,6 +19,7 @@ Steps:
   8. Train the XGBoost model with AUC evaluation
   9. Evaluate performance (AUC, classification report)
  10. Save the trained model to disk
+ 11. Compile the model into a native shared library with Treelite (if installed)
 """
 
 import joblib
@@ -30,46 +31,23 @@ from sqlalchemy import create_engine
 from sklearn.model_selection import train_test_split
 from sklearn.impute import SimpleImputer
 from sklearn.metrics import roc_auc_score, classification_report
+from etl import read_table
 
 # ─── 1) Resolve database path and create engine ─────────────────────────────────
 ROOT    = Path(__file__).resolve().parent.parent
 DB_PATH = ROOT / "data" / "processed" / "risk_insights.db"
 engine  = create_engine(f"sqlite:///{DB_PATH}")
 
-# ─── 2) Load account + transaction data ─────────────────────────────────────────
-df_tx   = pd.read_sql_table("fact_transactions", engine)
-df_acct = pd.read_sql_table("dim_accounts",      engine)
+# ─── 2) Load the per-client feature table ────────────────────────────────────────
+# Aggregated once by etl.py: one row per client instead of the full fact table
+features = read_table("feat_clients", engine,
+                      parse_dates=["first_opened_date", "last_transaction_date"])
 
-# Ensure datetime types
-df_tx["transaction_date"] = pd.to_datetime(df_tx["transaction_date"])
-df_acct["opened_date"]    = pd.to_datetime(df_acct["opened_date"])
-
-# Merge on account_id, suffix overlapping columns
-# fact_transactions and dim_accounts both have client_id; we keep client_id from transactions
-df = df_tx.merge(
-    df_acct,
-    on="account_id",
-    suffixes=("_tx", "_acct")
-)
-# Standardize client_id column
-df["client_id"] = df["client_id_tx"]
-# Drop redundant columns
-df = df.drop(columns=["client_id_tx", "client_id_acct"])
-
-# ─── 3) Aggregate features by client_id ────────────────────────────────────────
-# Sort to compute recency correctly
-df = df.sort_values(["client_id", "transaction_date"])
-features = (
-    df
-    .groupby("client_id")
-    .agg(
-        tenure_days     = ("opened_date",      lambda d: (pd.Timestamp.today() - d.min()).days),
-        avg_balance     = ("amount",           "mean"),
-        total_tx_count  = ("transaction_id",   "count"),
-        days_since_last = ("transaction_date", lambda d: (pd.Timestamp.today() - d.max()).days)
-    )
-    .reset_index()
-)
+# ─── 3) Derive features by client_id ───────────────────────────────────────────
+# Day counts are relative to today, so they are computed from the stored dates
+today = pd.Timestamp.today()
+features["tenure_days"]     = (today - features["first_opened_date"]).dt.days
+features["days_since_last"] = (today - features["last_transaction_date"]).dt.days
 
 # ─── 4) Simulate or load the 'is_churn' target ───────────────────────────────
 if "is_churn" not in features.columns:
@@ -80,7 +58,10 @@ if "is_churn" not in features.columns:
 imputer = SimpleImputer(missing_values=np.nan, strategy="mean")
 X = features[["tenure_days", "avg_balance", "total_tx_count", "days_since_last"]]
 y = features["is_churn"]
-X_imputed = pd.DataFrame(imputer.fit_transform(X), columns=X.columns)
+X_imputed = pd.DataFrame(
+    imputer.fit_transform(X.to_numpy(dtype=np.float64, na_value=np.nan)),
+    columns=X.columns
+)
 
 # ─── 6) Split data into train and test sets ────────────────────────────────────
 X_train, X_test, y_train, y_test = train_test_split(
@@ -113,6 +94,22 @@ print(report)
 # ─── 10) Save the trained model ─────────────────────────────────────────────────
 model_dir  = ROOT / "models"
 model_dir.mkdir(exist_ok=True)
-model_path = model_dir / "xgb_churn.json"
+model_path = model_dir / "xgb_churn.ubj"
 bst.save_model(model_path)
 print(f"Model saved to {model_path}")
+
+# ─── 11) Compile the model for low-latency serving ─────────────────────────────
+# The API loads xgb_churn.so when present and falls back to the Booster otherwise
+lib_path = model_dir / "xgb_churn.so"
+try:
+    import treelite
+    import tl2cgen
+except ImportError:
+    # a library left from an earlier run would be served instead of this model
+    lib_path.unlink(missing_ok=True)
+    print("Treelite not installed, skipping native model compilation (removed any previous one)")
+else:
+    tl_model = treelite.frontend.load_xgboost_model(model_path)
+    tl2cgen.export_lib(tl_model, toolchain="gcc", libpath=lib_path,
+                       params={"parallel_comp": 4}, verbose=False)
+    print(f"Compiled model saved to {lib_path}")
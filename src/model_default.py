@@ -6,8 +6,8 @@ handling missing feature values via imputation.
 
 Steps:
   1. Resolve the path to the processed datamart
-  2. Load transaction and time dimension tables
-  3. Aggregate features per account:
+  2. Load the feat_accounts table materialized by the ETL
+  3. Per-account features, aggregated in the ETL:
      - avg_amount: mean transaction amount
      - std_amount: standard deviation of amounts
      - tx_count_per_day: transactions per day
@@ -19,6 +19,7 @@ Steps:
   8. Train the model
   9. Evaluate performance (AUC, confusion matrix, classification report)
  10. Save the trained model to disk
+ 11. Export the model to ONNX for the API (if skl2onnx is installed)
 """
 
 import joblib
@@ -32,38 +33,20 @@ from sklearn.preprocessing import StandardScaler
 from sklearn.impute import SimpleImputer
 from sklearn.linear_model import LogisticRegression
 from sklearn.metrics import roc_auc_score, confusion_matrix, classification_report
+from etl import read_table
 
 # ─── 1) Resolve database path and create engine ─────────────────────────────────
 ROOT    = Path(__file__).resolve().parent.parent
 DB_PATH = ROOT / "data" / "processed" / "risk_insights.db"
 engine  = create_engine(f"sqlite:///{DB_PATH}")
 
-# ─── 2) Load raw transactions and time dimension ─────────────────────────────────
-df_tx   = pd.read_sql_table("fact_transactions", engine)
-df_time = pd.read_sql_table("dim_time",         engine)
-
-# Compute total number of unique days for frequency calculation
-total_days = df_time["date"].nunique()
-
-# ─── 3) Aggregate features by account_id ────────────────────────────────────────
-# Sort to compute inter-transaction delays correctly
-df_tx = df_tx.sort_values(["account_id", "transaction_date"])
-
-features = (
-    df_tx
-    .groupby("account_id")
-    .agg(
-        avg_amount     = ("amount",         "mean"),                       # mean transaction amount
-        std_amount     = ("amount",         "std"),                        # standard deviation of amounts
-        tx_count       = ("transaction_id", "count"),                      # total number of transactions
-        avg_delay_days = ("transaction_date", lambda d:                    # average days between transactions
-                                       d.diff().dt.days.dropna().mean())
-    )
-    .reset_index()
-)
+# ─── 2) Load the per-account feature table ───────────────────────────────────────
+# Aggregated once by etl.py: one row per account instead of the full fact table
+features = read_table("feat_accounts", engine)
 
-# Calculate transactions per day
-features["tx_count_per_day"] = features["tx_count"] / total_days
+# ─── 3) Features by account_id ─────────────────────────────────────────────────
+# avg_amount, std_amount, tx_count, avg_delay_days and tx_count_per_day
+# (see etl.build_account_features)
 
 # ─── 4) Simulate or load the 'is_default' target ───────────────────────────────
 if "is_default" not in features.columns:
@@ -81,7 +64,7 @@ y = features["is_default"]  # 0 = no default, 1 = default
 
 # Apply imputation before splitting
 X_imputed = pd.DataFrame(
-    imputer.fit_transform(X),
+    imputer.fit_transform(X.to_numpy(dtype=np.float64, na_value=np.nan)),
     columns=X.columns,
     index=X.index
 )
@@ -128,3 +111,22 @@ model_dir.mkdir(exist_ok=True)
 model_path = model_dir / "logreg_default.pkl"
 joblib.dump(pipe, model_path)
 print(f"Model saved to {model_path}")
+# The fitted imputer is reused at scoring time, so missing features get the training means
+imputer_path = model_dir / "imputer_default.pkl"
+joblib.dump(imputer, imputer_path)
+print(f"Imputer saved to {imputer_path}")
+
+# ─── 11) Export the model to ONNX for low-latency serving ──────────────────────
+# The API scores with onnxruntime when logreg_default.onnx is present
+onnx_path = model_dir / "logreg_default.onnx"
+try:
+    from skl2onnx import to_onnx
+except ImportError:
+    # an export left from an earlier run would be served instead of this model
+    onnx_path.unlink(missing_ok=True)
+    print("skl2onnx not installed, skipping ONNX export (removed any previous one)")
+else:
+    onx = to_onnx(pipe, X_train[:1].to_numpy(dtype=np.float32),
+                  target_opset=17, options={"zipmap": False})
+    onnx_path.write_bytes(onx.SerializeToString())
+    print(f"ONNX model saved to {onnx_path}")
@@ -12,20 +12,20 @@ Orchestrate the end-to-end workflow:
 Usage:
     python src/pipeline.py
 """
-import json
 from datetime import datetime
 from pathlib import Path
 
 import mlflow
+import numpy as np
+import orjson
 import pandas as pd
 import joblib
 import xgboost as xgb
 from sqlalchemy import create_engine
-from sklearn.impute import SimpleImputer
 
 # Import ETL and anomaly modules
-from etl import main as run_etl
-from anomaly import load_data as load_tx_data, detect_anomalies
+from etl import main as run_etl, read_table, build_account_features, build_client_features
+from anomaly import add_tx_per_account, detect_anomalies
 
 # ─── Configuration ─────────────────────────────────────────────────────────────
 ROOT        = Path(__file__).resolve().parent.parent
@@ -34,95 +34,97 @@ REPORT_DIR  = ROOT / "data" / "reports"
 REPORT_DIR.mkdir(parents=True, exist_ok=True)
 
 MODEL_DEF   = ROOT / "models" / "logreg_default.pkl"
-MODEL_CHURN = ROOT / "models" / "xgb_churn.json"
+IMPUTER_DEF = ROOT / "models" / "imputer_default.pkl"
+MODEL_CHURN = ROOT / "models" / "xgb_churn.ubj"
+
+RUN_TS      = datetime.utcnow()  # one timestamp for the report body and its filename
 
 # ─── 1) ETL ─────────────────────────────────────────────────────────────────────
 run_etl()
 engine = create_engine(f"sqlite:///{DB_PATH}")
 
+# Read each table once, dates parsed by the reader; every step below works on these frames
+df_tx     = read_table("fact_transactions", engine, parse_dates=["transaction_date"])
+df_acct   = read_table("dim_accounts",      engine, parse_dates=["opened_date"])
+df_time   = read_table("dim_time",          engine)
+
 # ─── 2) Default Scoring ─────────────────────────────────────────────────────────
-df_tx     = pd.read_sql_table("fact_transactions", engine)
-df_time   = pd.read_sql_table("dim_time",        engine)
-
-total_days = df_time['date'].nunique()
-df_tx = df_tx.sort_values(["account_id", "transaction_date"])
-
-features_def = (
-    df_tx.groupby("account_id").agg(
-        avg_amount     = ("amount",         "mean"),
-        std_amount     = ("amount",         "std"),
-        tx_count       = ("transaction_id", "count"),
-        avg_delay_days = ("transaction_date", lambda d: d.diff().dt.days.dropna().mean())
-    )
-    .reset_index()
-)
-features_def['tx_count_per_day'] = features_def['tx_count'] / total_days
-
-# Impute missing values
-X_def = features_def[["avg_amount","std_amount","tx_count_per_day","avg_delay_days"]]
-imputer_def = SimpleImputer(strategy="mean")
-X_def_imputed = imputer_def.fit_transform(X_def)
+# same builtin groupby aggregations + vectorized delays that feed feat_accounts
+total_days   = df_time['date'].nunique()
+features_def = build_account_features(df_tx, total_days)
+
+# Impute missing values with the training-time column means persisted by model_default.py
+X_def_imputed = features_def[["avg_amount","std_amount","tx_count_per_day","avg_delay_days"]] \
+    .to_numpy(dtype=np.float64, na_value=np.nan)
+rows, cols = np.nonzero(np.isnan(X_def_imputed))
+X_def_imputed[rows, cols] = joblib.load(IMPUTER_DEF).statistics_[cols]
 
 # Load and predict
 def_model = joblib.load(MODEL_DEF)
-def_prob = def_model.predict_proba(X_def_imputed)[:, 1]
+# float32 is plenty for a probability, and matches the churn scores inplace_predict returns
+def_prob = def_model.predict_proba(X_def_imputed)[:, 1].astype(np.float32)
 features_def['default_risk'] = def_prob
 
 # ─── 3) Churn Prediction ───────────────────────────────────────────────────────
-df_tx   = pd.read_sql_table("fact_transactions", engine)
-df_acct = pd.read_sql_table("dim_accounts",      engine)
-
-df_tx['transaction_date'] = pd.to_datetime(df_tx['transaction_date'])
-df_acct['opened_date']    = pd.to_datetime(df_acct['opened_date'])
-
-df_merge = df_tx.merge(df_acct, on='account_id', suffixes=('_tx','_acct'))
-df_merge['client_id'] = df_merge['client_id_tx']
-
-features_churn = (
-    df_merge.groupby('client_id').agg(
-        tenure_days    = ('opened_date',      lambda d: (pd.Timestamp.today() - d.min()).days),
-        avg_balance    = ('amount',            'mean'),
-        total_tx_count = ('transaction_id',    'count'),
-        days_since_last= ('transaction_date',  lambda d: (pd.Timestamp.today() - d.max()).days)
-    )
-    .reset_index()
-)
+# builtin min/max aggregations, then one vectorized subtraction per column
+features_churn = build_client_features(df_tx, df_acct)
+today = pd.Timestamp.today()
+features_churn['tenure_days']     = (today - features_churn['first_opened_date']).dt.days
+features_churn['days_since_last'] = (today - features_churn['last_transaction_date']).dt.days
 
 # Load XGBoost model and predict
 churn_model = xgb.Booster()
 churn_model.load_model(str(MODEL_CHURN))
-dmat = xgb.DMatrix(
-    features_churn[['tenure_days','avg_balance','total_tx_count','days_since_last']]
-)
-churn_prob = churn_model.predict(dmat)
+# to_numpy on a multi-dtype frame comes out column-major: make it the row-major
+# float32 buffer inplace_predict reads without another copy
+X_churn = np.ascontiguousarray(features_churn[
+    ['tenure_days','avg_balance','total_tx_count','days_since_last']
+].to_numpy(dtype=np.float32))
+churn_prob = churn_model.inplace_predict(X_churn)
 features_churn['churn_risk'] = churn_prob
 
 # ─── 4) Anomaly Detection ──────────────────────────────────────────────────────
-df_anom = load_tx_data().pipe(lambda df: detect_anomalies(df, contamination=0.05))
-
-# Convert datetime to string for JSON
-if 'transaction_date' in df_anom.columns:
-    df_anom['transaction_date'] = df_anom['transaction_date'].astype(str)
+# shallow copy: tx_per_account is added without touching df_tx's data
+df_anom = add_tx_per_account(df_tx.copy(deep=False))
+anomaly_score, is_anomaly = detect_anomalies(df_anom, contamination=0.05)
+# the score columns are only ever used on flagged rows: attach them to those alone
+df_anom = df_anom.loc[is_anomaly].assign(anomaly_score=anomaly_score[is_anomaly], is_anomaly=True)
 
 # ─── 5) MLflow Tracking ────────────────────────────────────────────────────────
 mlflow.set_experiment("Risk_and_Customer_Insights")
 with mlflow.start_run():
     mlflow.log_artifact(str(MODEL_DEF), artifact_path='models')
     mlflow.log_artifact(str(MODEL_CHURN), artifact_path='models')
-    mlflow.log_metric('avg_default_risk', float(features_def['default_risk'].mean()))
-    mlflow.log_metric('avg_churn_risk',   float(features_churn['churn_risk'].mean()))
-    mlflow.log_metric('n_anomalies',      int(df_anom['is_anomaly'].sum()))
+    # reduce the prediction arrays directly rather than through the Series wrappers
+    mlflow.log_metric('avg_default_risk', float(def_prob.mean()))
+    mlflow.log_metric('avg_churn_risk',   float(churn_prob.mean()))
+    mlflow.log_metric('n_anomalies',      int(np.count_nonzero(is_anomaly)))
 
 # ─── 6) Generate JSON Report ───────────────────────────────────────────────────
-report = {
-    'timestamp': datetime.utcnow().isoformat(),
-    'default_risk_summary': features_def[['account_id','default_risk']].to_dict(orient='records'),
-    'churn_risk_summary':   features_churn[['client_id','churn_risk']].to_dict(orient='records'),
-    'anomalies':            df_anom[df_anom['is_anomaly']].to_dict(orient='records')
+# Each section is built only when it is written, so one at a time is in memory
+report_sections = {
+    'timestamp':            lambda: RUN_TS.isoformat(),
+    # column-oriented {'account_id': [...], 'default_risk': [...]}: orjson encodes the
+    # numpy arrays directly instead of one dict per account / client
+    'default_risk_summary': lambda: {'account_id': features_def['account_id'].to_numpy(),
+                                     'default_risk': features_def['default_risk'].to_numpy()},
+    'churn_risk_summary':   lambda: {'client_id':  features_churn['client_id'].to_numpy(),
+                                     'churn_risk': features_churn['churn_risk'].to_numpy()},
+    # encoded straight to JSON by pandas' C writer: no per-row dicts
+    'anomalies':            lambda: df_anom.to_json(orient='records', date_format='iso', date_unit='us',
+                                                      double_precision=15).encode()
 }
 
-report_path = REPORT_DIR / f"report_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.json"
-with open(report_path, 'w') as f:
-    json.dump(report, f, indent=2)
+report_path = REPORT_DIR / f"report_{RUN_TS.strftime('%Y%m%d_%H%M%S')}.json"
+with open(report_path, 'wb') as f:
+    f.write(b'{')
+    for i, (key, build_section) in enumerate(report_sections.items()):
+        f.write(b',\n  ' if i else b'\n  ')
+        f.write(orjson.dumps(key) + b': ')
+        section = build_section()
+        # bytes are sections already encoded as JSON, written as-is
+        f.write(section if isinstance(section, bytes)
+                else orjson.dumps(section, option=orjson.OPT_SERIALIZE_NUMPY))
+    f.write(b'\n}\n')
 
 print(f"Pipeline complete. Report written to {report_path}")
@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+
+import anomaly
+
+
+def test_apply_threshold_flags_top_fraction():
+    scores = np.arange(100, dtype=np.float64)
+    mask = anomaly.apply_threshold(scores, 0.05)
+    assert mask.sum() == 5
+    assert mask[-5:].all()
+
+
+@pytest.mark.parametrize("contamination", [0.0, -0.1, 0.6, 1.5, 3.0])
+def test_apply_threshold_rejects_out_of_range_contamination(contamination):
+    with pytest.raises(ValueError):
+        anomaly.apply_threshold(np.arange(100, dtype=np.float64), contamination)
+
+
+def test_apply_threshold_rejects_empty_scores():
+    with pytest.raises(ValueError):
+        anomaly.apply_threshold(np.array([]), 0.05)
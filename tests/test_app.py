@@ -0,0 +1,105 @@
+import importlib
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+import etl
+
+# ─── Fixtures ──────────────────────────────────────────────────────────────────
+@pytest.fixture(scope="module")
+def client(tmp_path_factory):
+    """
+    Build a small datamart with the ETL and serve it with a fresh import of app.
+    """
+    tmp_path = tmp_path_factory.mktemp("datamart")
+    raw_dir = tmp_path / "raw"
+    raw_dir.mkdir()
+
+    # 3 accounts over 2 clients, 40 transactions spread over 20 days
+    rng = np.random.default_rng(0)
+    pd.DataFrame({
+        "account_id": [1, 2, 3],
+        "client_id": [10, 10, 20],
+        "account_type": ["A", "B", "A"],
+        "opened_date": ["2020-01-01", "2021-06-15", "2019-03-10"],
+    }).to_csv(raw_dir / "accounts.csv", index=False)
+    pd.DataFrame({
+        "transaction_id": np.arange(100, 140),
+        "account_id": np.tile([1, 2, 3, 3], 10),
+        "transaction_date": pd.date_range("2022-03-01", periods=40, freq="12h").strftime("%Y-%m-%d %H:%M"),
+        "amount": rng.normal(0, 100, 40).round(2),
+        "transaction_type": rng.choice(["debit", "credit"], 40),
+    }).to_csv(raw_dir / "transactions.csv", index=False)
+    pd.DataFrame({
+        "client_id": [10, 20],
+        "name": ["Alice", "Bob"],
+        "birthdate": ["1990-05-10", "1985-07-20"],
+        "country": ["FR", "US"],
+    }).to_csv(raw_dir / "kyc.csv", index=False)
+
+    db_file = tmp_path / "risk_insights.db"
+    accts, txs, kyc = etl.extract_raw(raw_dir)
+    engine, metadata = etl.create_engine_and_metadata(f"sqlite:///{db_file}")
+    tables = etl.define_star_schema(metadata)
+    metadata.create_all(engine)
+    etl.load_data(etl.clean_accounts(accts), etl.clean_transactions(txs), etl.clean_kyc(kyc),
+                  engine, tables)
+
+    # app reads the datamart at import, so point it at ours before importing
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(etl, "DB_PATH", db_file)
+        mp.delitem(sys.modules, "app", raising=False)
+        app = importlib.import_module("app")
+        yield TestClient(app.app)
+    sys.modules.pop("app", None)
+
+# ─── Tests ─────────────────────────────────────────────────────────────────────
+
+def test_score_default_bulk_matches_single_scores(client):
+    scores = client.post("/score_default_bulk", json={"account_ids": [1, 3, 999]}).json()
+    # unknown ids are dropped, JSON keys are the ids as strings
+    assert set(scores) == {"1", "3"}
+    for account_id in (1, 3):
+        single = client.post("/score_default", json={"account_id": account_id}).json()
+        assert scores[str(account_id)] == pytest.approx(single["default_score"], rel=1e-6)
+
+
+def test_predict_churn_bulk_matches_single_scores(client):
+    scores = client.post("/predict_churn_bulk", json={"client_ids": [10, 20, 999]}).json()
+    assert set(scores) == {"10", "20"}
+    for client_id in (10, 20):
+        single = client.post("/predict_churn", json={"client_id": client_id}).json()
+        assert scores[str(client_id)] == pytest.approx(single["churn_score"], rel=1e-6)
+
+
+@pytest.mark.parametrize("path, key", [
+    ("/score_default_bulk", "account_ids"),
+    ("/predict_churn_bulk", "client_ids"),
+])
+def test_bulk_endpoints_empty_and_oversized(client, path, key):
+    import app
+    assert client.post(path, json={key: []}).json() == {}
+    assert client.post(path, json={key: [999]}).json() == {}
+    response = client.post(path, json={key: list(range(app.MAX_BULK_IDS + 1))})
+    assert response.status_code == 422
+
+
+def test_detect_anomaly_returns_columns(client):
+    response = client.post("/detect_anomaly", json={"contamination": 0.1})
+    assert response.status_code == 200
+    payload = response.json()
+    # one array per column, all of the same length
+    assert {"transaction_id", "account_id", "amount", "anomaly_score", "is_anomaly"} <= set(payload)
+    lengths = {len(values) for values in payload.values()}
+    assert lengths == {4}
+    assert all(payload["is_anomaly"])
+    assert payload["anomaly_score"] == sorted(payload["anomaly_score"], reverse=True)
+
+
+@pytest.mark.parametrize("contamination", [0, -0.1, 0.6])
+def test_detect_anomaly_rejects_out_of_range_contamination(client, contamination):
+    response = client.post("/detect_anomaly", json={"contamination": contamination})
+    assert response.status_code == 422
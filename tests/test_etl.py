@@ -1,7 +1,8 @@
+import numpy as np
 import pandas as pd
 import pytest
 from pathlib import Path
-from sqlalchemy import create_engine, inspect
+from sqlalchemy import create_engine, inspect, text
 
 import etl
 
@@ -95,6 +96,55 @@ def test_clean_kyc():
     assert cleaned["birthdate"].dtype == "datetime64[ns]"
 
 
+def test_build_account_features():
+    df_tx = pd.DataFrame({
+        "transaction_id": [1, 2, 3, 4],
+        "account_id": [1, 1, 1, 2],
+        "transaction_date": pd.to_datetime(["2022-03-05", "2022-03-01", "2022-03-03", "2022-03-01"]),
+        "amount": [30.0, 10.0, 20.0, 5.0],
+    })
+    features = etl.build_account_features(df_tx, total_days=10).set_index("account_id")
+    assert features.loc[1, "avg_amount"] == 20.0
+    assert features.loc[1, "tx_count"] == 3
+    assert features.loc[1, "avg_delay_days"] == 2.0
+    assert features.loc[1, "tx_count_per_day"] == 0.3
+    # a single transaction has no delay nor standard deviation
+    assert pd.isna(features.loc[2, "avg_delay_days"])
+    assert pd.isna(features.loc[2, "std_amount"])
+
+
+def test_mean_delay_days_floors_like_timedelta_days():
+    account_ids = np.array([1, 1, 1, 2])
+    dates = pd.to_datetime([
+        "2022-03-01 23:00", "2022-03-02 01:00", "2022-03-04 00:00", "2022-03-01 00:00"
+    ]).to_numpy()
+    delays = etl.mean_delay_days(account_ids, dates)
+    # 2h -> 0 days, 47h -> 1 day, as with Series.diff().dt.days
+    assert delays[0] == 0.5
+    assert pd.isna(delays[1])
+
+
+def test_build_client_features():
+    df_tx = pd.DataFrame({
+        "transaction_id": [1, 2, 3],
+        "account_id": [1, 2, 3],
+        "client_id": [10, 10, 20],
+        "transaction_date": pd.to_datetime(["2022-03-01", "2022-03-04", "2022-03-02"]),
+        "amount": [10.0, 30.0, 5.0],
+    })
+    df_accounts = pd.DataFrame({
+        "account_id": [1, 2, 3],
+        "client_id": [10, 10, 20],
+        "opened_date": pd.to_datetime(["2020-01-01", "2019-06-01", "2021-01-01"]),
+    })
+    features = etl.build_client_features(df_tx, df_accounts).set_index("client_id")
+    assert features.loc[10, "first_opened_date"] == pd.Timestamp("2019-06-01")
+    assert features.loc[10, "last_transaction_date"] == pd.Timestamp("2022-03-04")
+    assert features.loc[10, "avg_balance"] == 20.0
+    assert features.loc[10, "total_tx_count"] == 2
+    assert features.loc[20, "total_tx_count"] == 1
+
+
 def test_full_etl(tmp_path, raw_data_dir, monkeypatch):
     # Redirect ROOT and RAW_DIR
     project_root = tmp_path
@@ -114,7 +164,8 @@ def test_full_etl(tmp_path, raw_data_dir, monkeypatch):
     tables = inspector.get_table_names()
     expected = [
         "dim_clients", "dim_accounts", "dim_time",
-        "fact_transactions", "fact_events"
+        "fact_transactions", "fact_events",
+        "feat_accounts", "feat_clients"
     ]
     for tbl in expected:
         assert tbl in tables, f"Expected table {tbl} in database"
@@ -122,3 +173,28 @@ def test_full_etl(tmp_path, raw_data_dir, monkeypatch):
     # Verify dim_time content
     df_time = pd.read_sql_table("dim_time", engine)
     assert not df_time.empty
+
+
+def test_reload_updates_database_file(tmp_path, raw_data_dir):
+    accts, txs, kyc = etl.extract_raw(raw_data_dir / "raw")
+    accts, txs, kyc = etl.clean_accounts(accts), etl.clean_transactions(txs), etl.clean_kyc(kyc)
+    db_file = tmp_path / "risk_insights.db"
+    engine, metadata = etl.create_engine_and_metadata(f"sqlite:///{db_file}")
+    tables = etl.define_star_schema(metadata)
+    metadata.create_all(engine)
+    etl.load_data(accts, txs, kyc, engine, tables)
+
+    # a reader keeps a pooled connection open, as the API does
+    reader = create_engine(f"sqlite:///{db_file}")
+    with reader.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM fact_transactions")).scalar() == 2
+    mtime = db_file.stat().st_mtime_ns
+
+    etl.load_data(accts, txs.iloc[:1], kyc, engine, tables)
+
+    # the new rows are in the main file, not left behind in a -wal log
+    assert db_file.stat().st_mtime_ns != mtime
+    assert not db_file.with_name(db_file.name + "-wal").exists()
+    with reader.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "delete"
+        assert conn.execute(text("SELECT COUNT(*) FROM fact_transactions")).scalar() == 1
@@ -50,12 +50,16 @@ def test_default_model_training(repo_root, models_dir):
     assert hasattr(model, "predict"), "Loaded default model has no predict method"
     assert hasattr(model, "predict_proba"), "Loaded default model has no predict_proba method"
 
+    # The imputer is persisted next to the model with one mean per feature
+    imputer = joblib.load(str(models_dir / "imputer_default.pkl"))
+    assert imputer.statistics_.shape == (4,), "Persisted imputer has unexpected statistics"
+
 
 def test_churn_model_training(repo_root, models_dir):
     """
     Run the churn prediction script and verify the XGBoost model file is created and loadable.
     """
-    churn_path = models_dir / "xgb_churn.json"
+    churn_path = models_dir / "xgb_churn.ubj"
     # Remove existing model if present
     if churn_path.exists():
         churn_path.unlink()
@@ -1,10 +1,13 @@
 # tests/test_reporting.py
 
 import subprocess
+import numpy as np
 import pandas as pd
 from pathlib import Path
 import pytest
 
+import reporting
+
 # ─── Fixtures ──────────────────────────────────────────────────────────────────
 @pytest.fixture(scope="module")
 def repo_root():
@@ -61,3 +64,17 @@ def test_run_reporting_pipeline(repo_root):
         assert not df.empty, f"Exported CSV {csv_file.name} is empty"
         # Check basic structure: at least 2 columns
         assert df.shape[1] >= 2, f"Exported CSV {csv_file.name} has unexpected format"
+
+
+def test_generate_kpi_summary():
+    df_tx = pd.DataFrame({
+        "transaction_id": [1, 2, 3, 4, 5],
+        "transaction_type": ["debit", "credit", "debit", None, "credit"],
+        "amount": [10.0, 5.0, 30.0, 100.0, np.nan],
+    })
+    kpi = reporting.generate_kpi_summary(df_tx)
+    assert kpi["transaction_type"].tolist() == ["credit", "debit"]
+    assert kpi["total_amount"].tolist() == [5.0, 40.0]
+    assert kpi["avg_amount"].tolist() == [5.0, 20.0]
+    # the NaN amount is skipped by sum/mean but the transaction still counts
+    assert kpi["count"].tolist() == [2, 2]